@@ -6,6 +6,10 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
+from langchain_core.messages import HumanMessage
+from .llm import invoke_llm
+from .retrieval import retrieve_relevant_chunks, retrieve_changed_chunks, NOT_FOUND
+from .history import format_changed_sections, release_changed, mark_carried_forward, prior_period_label, analysis_date
 
 # Import or define the state type
 class EarningsAnalysisState(TypedDict):
@@ -19,7 +23,54 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
     
+def incremental_credit_analysis(state: EarningsAnalysisState, vectorstore, llm, queries: List[str]) -> Optional[str]:
+    """
+    Update the previous quarter's credit analysis using only the
+    sections of the new release that changed. Returns None when no changed
+    section is relevant, so the caller runs the full analysis instead.
+    """
+    previous = state['previous_analysis']
+    if not release_changed(state):
+        print("Earnings release unchanged, carrying forward previous credit analysis")
+        return mark_carried_forward(previous['credit_analysis'], previous)
+    
+    changed_sections = retrieve_changed_chunks(vectorstore, queries)
+    if not changed_sections:
+        return None
+    
+    print(f"Updating credit analysis from {len(changed_sections)} changed sections")
+    prompt = f"""
+    Update the credit assessment for {state['ticker']} for the new quarter.
+    
+    Previous quarter's analysis (generated {analysis_date(previous)}):
+    {previous['credit_analysis']}
+    
+    Current Financial Analysis:
+    {state['financial_analysis']}
+    
+    New or changed sections of the latest earnings release:
+    {format_changed_sections(changed_sections)}
+    
+    Replace figures and conclusions that the new sections update. Label anything you keep
+    from the previous analysis that the new sections do not confirm as "({prior_period_label(previous)})".
+    Only include information that is explicitly stated in the sections or the analyses above.
+    
+    Keep the same structure:
+    1. Leverage Analysis
+    2. Debt Structure & Coverage
+    3. Liquidity Position
+    4. Cash Flow Analysis
+    5. Credit Outlook
+    
+    Focus on credit metrics and their implications for financial health.
+    """
+    
+    response = invoke_llm(llm, [HumanMessage(content=prompt)])
+    return response.content
+
 def credit_analyst_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
     """
     Credit Analyst agent that:
@@ -43,14 +94,31 @@ def credit_analyst_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
             "What are the capital allocation priorities and any mentioned refinancing plans?"
         ]
 
+        # Incremental mode: build on the previous quarter's conclusions
+        previous = state.get('previous_analysis') or {}
+        if previous.get('credit_analysis'):
+            incremental_analysis = incremental_credit_analysis(state, vectorstore, llm, credit_queries)
+            if incremental_analysis is not None:
+                state['credit_analysis'] = incremental_analysis
+                print("\nIncremental credit analysis completed successfully!")
+                return state
+            print("No relevant changed sections found, running full credit analysis")
+
         # Collect credit findings
         findings = {}
         for query in credit_queries:
             print(f"\nAnalyzing: {query}")
             
             # Get relevant document chunks
-            relevant_docs = vectorstore.similarity_search(query, k=3)
-            context = "\n\n".join(doc.page_content for doc in relevant_docs)
+            relevant_docs = retrieve_relevant_chunks(vectorstore, query)
+            
+            # Skip the LLM call when nothing in the release matches the query
+            if not relevant_docs:
+                print("No relevant context found, skipping LLM call")
+                findings[query] = NOT_FOUND
+                continue
+            
+            context = "\n\n".join(doc.page_content for doc, _ in relevant_docs)
             
             # Create analysis prompt
             prompt = f"""
@@ -68,7 +136,7 @@ def credit_analyst_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
             {state['financial_analysis']}
             """
             
-            response = llm.invoke([HumanMessage(content=prompt)])
+            response = invoke_llm(llm, [HumanMessage(content=prompt)])
             findings[query] = response.content
 
         # Create comprehensive credit analysis
@@ -103,15 +171,11 @@ def credit_analyst_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
         Be specific about numbers but also provide analytical insights.
         """
         
-        final_credit_analysis = llm.invoke([HumanMessage(content=credit_prompt)])
+        final_credit_analysis = invoke_llm(llm, [HumanMessage(content=credit_prompt)])
         
         # Update state
         state['credit_analysis'] = final_credit_analysis.content
         
-        # Only update status if industry analysis is already complete
-        if state['industry_analysis']:
-            state['status'] = 'summary_needed'
-        
         print("\nCredit analysis completed successfully!")
         
     except Exception as e:
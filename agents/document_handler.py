@@ -6,6 +6,8 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.schema import Document
+from .history import section_hash
+from .memory import index_cache
 
 class EarningsAnalysisState(TypedDict):
     ticker: str
@@ -18,6 +20,8 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
 
 def load_pdf(file_path: str) -> List[Document]:
     """
@@ -44,11 +48,14 @@ def document_handler_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
     try:
         print(f"Processing documents for {state['ticker']}...")
         
-        # Get document path
-        earnings_path = Path(input("Please enter the path to the earnings release PDF: ").strip('"'))
+        # Get document path, unless the run was started with one (e.g. by the multi-run executor)
+        if "earnings_release" in state['documents']:
+            earnings_path = Path(state['documents']["earnings_release"])
+        else:
+            earnings_path = Path(input("Please enter the path to the earnings release PDF: ").strip('"'))
         
         # Validate file exists
-        if not earnings_path.exists():
+        if not earnings_path.is_file():
             raise FileNotFoundError(f"File not found: {earnings_path}")
             
         state['documents'] = {
@@ -57,7 +64,10 @@ def document_handler_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
         
         # Process documents
         documents = {}
+        section_hashes = []
         embeddings = OpenAIEmbeddings()
+        previous = state.get('previous_analysis') or {}
+        previous_hashes = set(previous.get('section_hashes', []))
         
         for doc_type, file_path in state['documents'].items():
             print(f"\nProcessing {doc_type}...")
@@ -75,12 +85,34 @@ def document_handler_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
             chunks = text_splitter.split_documents(pages)
             print(f"Created {len(chunks)} text chunks")
             
-            # Create vector store
-            vectorstore = FAISS.from_documents(chunks, embeddings)
+            # Flag sections that are new or changed since the previous quarter
+            for chunk in chunks:
+                chunk_hash = section_hash(chunk.page_content)
+                chunk.metadata["section_hash"] = chunk_hash
+                chunk.metadata["changed"] = chunk_hash not in previous_hashes
+                section_hashes.append(chunk_hash)
+            
+            if state.get('previous_analysis'):
+                changed = sum(1 for chunk in chunks if chunk.metadata["changed"])
+                print(f"{changed} of {len(chunks)} chunks changed since the previous analysis")
+            
+            # Reuse the index if this document was already embedded against the same history
+            vectorstore = None
+            if index_cache.enabled:
+                cache_key = index_cache.key_for(file_path, previous_hashes)
+                vectorstore = index_cache.get(cache_key, embeddings)
+            if vectorstore is not None:
+                print("Reusing cached index")
+            else:
+                # Create vector store with unit-length vectors so similarity scores are cosine-based
+                vectorstore = FAISS.from_documents(chunks, embeddings, normalize_L2=True)
+                if index_cache.enabled:
+                    index_cache.put(cache_key, vectorstore)
             documents[doc_type] = vectorstore
             print(f"Successfully processed {doc_type}")
         
         state['document_analysis'] = documents
+        state['section_hashes'] = section_hashes
         state['status'] = 'financial_analysis_complete'
         print("\nDocument processing completed successfully!")
         
@@ -6,6 +6,10 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
+from langchain_core.messages import HumanMessage
+from .llm import invoke_llm
+from .retrieval import retrieve_relevant_chunks, retrieve_changed_chunks, NOT_FOUND
+from .history import format_changed_sections, release_changed, mark_carried_forward, prior_period_label, analysis_date
 
 # Import or define the state type
 class EarningsAnalysisState(TypedDict):
@@ -19,7 +23,51 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
     
+def incremental_financial_analysis(state: EarningsAnalysisState, vectorstore, llm, queries: List[str]) -> Optional[str]:
+    """
+    Update the previous quarter's financial analysis using only the
+    sections of the new release that changed. Returns None when no changed
+    section is relevant, so the caller runs the full analysis instead.
+    """
+    previous = state['previous_analysis']
+    if not release_changed(state):
+        print("Earnings release unchanged, carrying forward previous financial analysis")
+        return mark_carried_forward(previous['financial_analysis'], previous)
+    
+    changed_sections = retrieve_changed_chunks(vectorstore, queries)
+    if not changed_sections:
+        return None
+    
+    print(f"Updating financial analysis from {len(changed_sections)} changed sections")
+    prompt = f"""
+    Update the credit financial analysis for {state['ticker']} for the new quarter.
+    
+    Previous quarter's analysis (generated {analysis_date(previous)}):
+    {previous['financial_analysis']}
+    
+    New or changed sections of the latest earnings release:
+    {format_changed_sections(changed_sections)}
+    
+    Replace figures and conclusions that the new sections update. Label anything you keep
+    from the previous analysis that the new sections do not confirm as "({prior_period_label(previous)})".
+    Only include information that is explicitly stated in the sections or the previous analysis.
+    
+    Keep the same format:
+    1. Revenue Performance
+    2. Profitability (EBITDA/margins)
+    3. Operational Metrics
+    4. Forward Guidance
+    5. Balance Sheet & Leverage
+    
+    Be concise and focus on key metrics and their changes.
+    """
+    
+    response = invoke_llm(llm, [HumanMessage(content=prompt)])
+    return response.content
+
 def financial_parser_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
     """
     Financial Parser agent that:
@@ -43,16 +91,32 @@ def financial_parser_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
             "What are the key balance sheet metrics and leverage ratios?"
         ]
 
+        # Incremental mode: build on the previous quarter's conclusions
+        previous = state.get('previous_analysis') or {}
+        if previous.get('financial_analysis'):
+            incremental_analysis = incremental_financial_analysis(state, vectorstore, llm, analysis_queries)
+            if incremental_analysis is not None:
+                state['financial_analysis'] = incremental_analysis
+                state['status'] = 'parallel_analysis_needed'
+                print("\nIncremental financial analysis completed successfully!")
+                return state
+            print("No relevant changed sections found, running full financial analysis")
+
         # Collect findings for each query
         findings = {}
         for query in analysis_queries:
             print(f"\nAnalyzing: {query}")
             
             # Get relevant document chunks
-            relevant_docs = vectorstore.similarity_search(query, k=3)
+            relevant_docs = retrieve_relevant_chunks(vectorstore, query)
+            
+            # Skip the LLM call when nothing in the release matches the query
+            if not relevant_docs:
+                print("No relevant context found, skipping LLM call")
+                findings[query] = NOT_FOUND
+                continue
             
-            # Combine relevant text
-            context = "\n\n".join(doc.page_content for doc in relevant_docs)
+            context = "\n\n".join(doc.page_content for doc, _ in relevant_docs)
             
             # Create analysis prompt
             prompt = f"""
@@ -66,7 +130,7 @@ def financial_parser_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
             """
             
             # Get LLM response
-            response = llm.invoke([HumanMessage(content=prompt)])
+            response = invoke_llm(llm, [HumanMessage(content=prompt)])
             findings[query] = response.content
 
         # Create comprehensive analysis
@@ -85,7 +149,7 @@ def financial_parser_agent(state: EarningsAnalysisState) -> EarningsAnalysisStat
         Be concise and focus on key metrics and their changes.
         """
         
-        final_analysis = llm.invoke([HumanMessage(content=analysis_prompt)])
+        final_analysis = invoke_llm(llm, [HumanMessage(content=analysis_prompt)])
         
         # Update state
         state['financial_analysis'] = final_analysis.content
@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional
+from pathlib import Path
+from datetime import datetime
+import hashlib
+import json
+import re
+
+HISTORY_DIR = "history"
+ANALYSIS_KEYS = ["financial_analysis", "credit_analysis", "industry_analysis", "final_comment"]
+CARRIED_FORWARD_PREFIX = re.compile(r"^(\[Carried forward \([^)]*\): the earnings release is unchanged\]\n)+")
+
+def section_hash(text: str) -> str:
+    """
+    Hash a document chunk so unchanged sections can be recognised across quarters
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def history_path(ticker: str) -> Path:
+    """
+    Directory holding the structured results of previous runs for a ticker
+    """
+    return Path("output") / ticker / HISTORY_DIR
+
+def load_previous_analysis(ticker: str) -> Optional[Dict]:
+    """
+    Load the most recent structured results saved for a ticker, if any. An
+    unreadable record is skipped with a warning so the run goes ahead in full.
+    """
+    path = history_path(ticker)
+    if not path.exists():
+        return None
+
+    records = sorted(path.glob(f"{ticker}_analysis_*.json"))
+    if not records:
+        return None
+
+    try:
+        with open(records[-1], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: could not read previous analysis {records[-1]}: {str(e)}. Running full analysis.")
+        return None
+
+def save_analysis(state: Dict) -> Path:
+    """
+    Save the structured results of a run so the next quarter can build on them
+    """
+    path = history_path(state['ticker'])
+    path.mkdir(parents=True, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    filename = path / f"{state['ticker']}_analysis_{timestamp}.json"
+    generated = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    record = {
+        "ticker": state['ticker'],
+        "industry": state['industry'],
+        "generated": generated,
+        # Date the analysed content comes from; carried over when nothing changed
+        "source_generated": generated,
+        "documents": state['documents'],
+        "section_hashes": state.get('section_hashes') or [],
+    }
+    for key in ANALYSIS_KEYS:
+        record[key] = state.get(key)
+
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+
+    return filename
+
+def release_changed(state: Dict) -> bool:
+    """
+    Whether the new release has any section that was not in the previous one
+    """
+    previous_hashes = set(state['previous_analysis'].get('section_hashes', []))
+    return any(section not in previous_hashes for section in state['section_hashes'])
+
+def analysis_date(previous: Dict) -> str:
+    """
+    Date the previous analysis was originally produced
+    """
+    return previous.get('source_generated') or previous.get('generated', 'the previous analysis')
+
+def prior_period_label(previous: Dict) -> str:
+    """
+    Label for conclusions taken over from the previous analysis
+    """
+    return f"prior period, as of {analysis_date(previous)}"
+
+def strip_carried_forward(text: str) -> str:
+    """
+    Remove carried-forward prefixes so they never stack
+    """
+    return CARRIED_FORWARD_PREFIX.sub("", text or "")
+
+def mark_carried_forward(text: str, previous: Dict) -> str:
+    """
+    Prefix a previous analysis that is reused unchanged so it is not read as new
+    """
+    return f"[Carried forward ({prior_period_label(previous)}): the earnings release is unchanged]\n{strip_carried_forward(text)}"
+
+def format_changed_sections(sections: List[str]) -> str:
+    """
+    Join changed sections into a single prompt context block
+    """
+    return "\n\n---\n\n".join(sections)
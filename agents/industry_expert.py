@@ -6,6 +6,10 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
+from langchain_core.messages import HumanMessage
+from .llm import invoke_llm
+from .retrieval import retrieve_relevant_chunks, retrieve_changed_chunks, NOT_FOUND
+from .history import format_changed_sections, release_changed, mark_carried_forward, prior_period_label, analysis_date
 
 # Import or define the state type
 class EarningsAnalysisState(TypedDict):
@@ -19,7 +23,55 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
     
+def incremental_industry_analysis(state: EarningsAnalysisState, vectorstore, llm, queries: List[str]) -> Optional[str]:
+    """
+    Update the previous quarter's industry analysis using only the
+    sections of the new release that changed. Returns None when no changed
+    section is relevant, so the caller runs the full analysis instead.
+    """
+    previous = state['previous_analysis']
+    if not release_changed(state):
+        print("Earnings release unchanged, carrying forward previous industry analysis")
+        return mark_carried_forward(previous['industry_analysis'], previous)
+    
+    changed_sections = retrieve_changed_chunks(vectorstore, queries)
+    if not changed_sections:
+        return None
+    
+    print(f"Updating industry analysis from {len(changed_sections)} changed sections")
+    prompt = f"""
+    Update the industry analysis for {state['ticker']} in the {state['industry']} sector for the new quarter.
+    
+    Previous quarter's analysis (generated {analysis_date(previous)}):
+    {previous['industry_analysis']}
+    
+    Current Analyses:
+    Financial Analysis: {state['financial_analysis']}
+    Credit Analysis: {state['credit_analysis']}
+    
+    New or changed sections of the latest earnings release:
+    {format_changed_sections(changed_sections)}
+    
+    Replace figures and conclusions that the new sections update. Label anything you keep
+    from the previous analysis that the new sections do not confirm as "({prior_period_label(previous)})".
+    Only include information that is explicitly stated in the sections or the analyses above.
+    
+    Keep the same structure:
+    1. Market Position
+    2. Industry Dynamics
+    3. Competitive Analysis
+    4. Operational Excellence
+    5. Sector Outlook
+    
+    Highlight any sector-specific insights that impact credit quality.
+    """
+    
+    response = invoke_llm(llm, [HumanMessage(content=prompt)])
+    return response.content
+
 def industry_expert_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
     """
     Industry Expert agent that:
@@ -44,14 +96,36 @@ def industry_expert_agent(state: EarningsAnalysisState) -> EarningsAnalysisState
             "What is mentioned about industry outlook or sector challenges?"
         ]
 
+        # Incremental mode: build on the previous quarter's conclusions
+        previous = state.get('previous_analysis') or {}
+        if previous.get('industry_analysis'):
+            incremental_analysis = incremental_industry_analysis(state, vectorstore, llm, industry_queries)
+            if incremental_analysis is not None:
+                state['industry_analysis'] = incremental_analysis
+            
+                # Only update status if credit analysis is already complete
+                if state['credit_analysis']:
+                    state['status'] = 'summary_needed'
+            
+                print("\nIncremental industry analysis completed successfully!")
+                return state
+            print("No relevant changed sections found, running full industry analysis")
+
         # Collect industry insights
         findings = {}
         for query in industry_queries:
             print(f"\nAnalyzing: {query}")
             
             # Get relevant document chunks
-            relevant_docs = vectorstore.similarity_search(query, k=3)
-            context = "\n\n".join(doc.page_content for doc in relevant_docs)
+            relevant_docs = retrieve_relevant_chunks(vectorstore, query)
+            
+            # Skip the LLM call when nothing in the release matches the query
+            if not relevant_docs:
+                print("No relevant context found, skipping LLM call")
+                findings[query] = NOT_FOUND
+                continue
+            
+            context = "\n\n".join(doc.page_content for doc, _ in relevant_docs)
             
             # Create analysis prompt
             prompt = f"""
@@ -70,7 +144,7 @@ def industry_expert_agent(state: EarningsAnalysisState) -> EarningsAnalysisState
             Credit Analysis: {state['credit_analysis']}
             """
             
-            response = llm.invoke([HumanMessage(content=prompt)])
+            response = invoke_llm(llm, [HumanMessage(content=prompt)])
             findings[query] = response.content
 
         # Create comprehensive industry analysis
@@ -110,7 +184,7 @@ def industry_expert_agent(state: EarningsAnalysisState) -> EarningsAnalysisState
         Highlight any sector-specific insights that impact credit quality.
         """
         
-        final_industry_analysis = llm.invoke([HumanMessage(content=industry_prompt)])
+        final_industry_analysis = invoke_llm(llm, [HumanMessage(content=industry_prompt)])
         
         # Update state
         state['industry_analysis'] = final_industry_analysis.content
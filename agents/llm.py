@@ -0,0 +1,100 @@
+from typing import List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import itertools
+import math
+import threading
+
+@dataclass
+class JobContext:
+    """
+    Scheduling attributes of the analysis run that issues an LLM call.
+    Lower priority values are more urgent; deadline is a time.monotonic() value.
+    """
+    name: str
+    priority: int = 10
+    deadline: float = math.inf
+
+@dataclass
+class _PendingCall:
+    job: JobContext
+    seq: int
+
+# Job of the run executing in the current thread or task, set by the multi-run executor
+current_job: ContextVar[Optional[JobContext]] = ContextVar("current_job", default=None)
+
+class LLMScheduler:
+    """
+    Shares a fixed number of concurrent LLM calls between analysis runs.
+
+    Whenever a slot frees up it goes to the waiting call with the best
+    (priority, deadline) — so a call from a newly arrived high-priority job
+    overtakes calls already queued by lower-priority jobs. Within a (priority,
+    deadline) level calls are served first come, first served; since each run
+    makes one call at a time, that alternates slots fairly between its jobs.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._available = max_concurrency
+        self._waiting: List[_PendingCall] = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+    def _next_call(self) -> _PendingCall:
+        return min(
+            self._waiting,
+            key=lambda call: (call.job.priority, call.job.deadline, call.seq),
+        )
+
+    def acquire(self, job: JobContext) -> None:
+        """
+        Block until this job's call is the most urgent one waiting and a slot is free
+        """
+        with self._condition:
+            call = _PendingCall(job=job, seq=next(self._seq))
+            self._waiting.append(call)
+            while not (self._available > 0 and self._next_call() is call):
+                self._condition.wait()
+            self._waiting.remove(call)
+            self._available -= 1
+            # Another slot may still be free for the next waiting call
+            self._condition.notify_all()
+
+    def release(self) -> None:
+        with self._condition:
+            self._available += 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, job: JobContext):
+        self.acquire(job)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._waiting)
+
+_llm_scheduler: Optional[LLMScheduler] = None
+
+def set_llm_scheduler(scheduler: Optional[LLMScheduler]) -> None:
+    """
+    Route LLM calls of scheduled jobs through a shared scheduler (None to disable)
+    """
+    global _llm_scheduler
+    _llm_scheduler = scheduler
+
+def invoke_llm(llm, messages):
+    """
+    Invoke the LLM, waiting for a scheduler slot when running under the multi-run executor
+    """
+    job = current_job.get()
+    if _llm_scheduler is None or job is None:
+        return llm.invoke(messages)
+
+    with _llm_scheduler.slot(job):
+        return llm.invoke(messages)
@@ -0,0 +1,285 @@
+from typing import Callable, Dict, Iterable, Optional
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+import gc
+import hashlib
+import inspect
+import os
+import shutil
+import sys
+import threading
+import tracemalloc
+from langchain.vectorstores import FAISS
+from .llm import current_job
+
+# Memory settings, overridable through the environment. The index cache is
+# off by default so nothing outlives a run unless explicitly configured.
+INDEX_CACHE_MAX_MB = float(os.getenv("EARNINGS_INDEX_CACHE_MB", "0"))
+INDEX_SPILL_DIR = os.getenv("EARNINGS_INDEX_SPILL_DIR")
+INDEX_SPILL_MAX_MB = float(os.getenv("EARNINGS_INDEX_SPILL_MAX_MB", "1024"))
+MEMORY_REPORT = os.getenv("EARNINGS_MEMORY_REPORT", "0") == "1"
+MEMORY_REPORT_TOP = int(os.getenv("EARNINGS_MEMORY_REPORT_TOP", "5"))
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Resident set size of this process in MB, or None if it cannot be read
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        import resource
+        # ru_maxrss is the peak, in bytes on macOS and KB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+# Python-side memory per stored chunk besides its text: Document object,
+# metadata dict, docstore id and id mapping (measured ~800 bytes, rounded up)
+CHUNK_OVERHEAD_BYTES = 1024
+
+def estimate_index_bytes(vectorstore) -> int:
+    """
+    Approximate memory held by a FAISS vector store: float32 vectors, chunk
+    text and per-chunk object overhead
+    """
+    index_bytes = vectorstore.index.ntotal * vectorstore.index.d * 4
+    docs = vectorstore.docstore._dict.values()
+    text_bytes = sum(sys.getsizeof(doc.page_content) for doc in docs)
+    return index_bytes + text_bytes + len(docs) * CHUNK_OVERHEAD_BYTES
+
+def load_spilled_index(path: Path, embeddings):
+    """
+    Load an index saved by the cache, restoring the L2 normalization it was built with
+    """
+    kwargs = {"normalize_L2": True}
+    # langchain-community >= 0.0.27 refuses to unpickle the docstore without this flag.
+    # Unpickling runs arbitrary code, so only load from a spill directory that
+    # IndexCache has checked is private to the current user (see secure_spill_dir).
+    if "allow_dangerous_deserialization" in inspect.signature(FAISS.load_local).parameters:
+        kwargs["allow_dangerous_deserialization"] = True
+    return FAISS.load_local(str(path), embeddings, **kwargs)
+
+def secure_spill_dir(path: Path) -> bool:
+    """
+    Create the spill directory as private (0o700) and check that nobody else
+    can have written to it. Returns False if it must not be used.
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return True
+
+    info = path.stat()
+    if info.st_uid != os.getuid():
+        print(f"Warning: index spill directory {path} is owned by another user; spilling disabled")
+        return False
+    if info.st_mode & 0o077:
+        # Ours but readable or writable by others: tighten it and drop anything already there
+        print(f"Warning: index spill directory {path} was accessible to other users; "
+              "restricting it and discarding existing spills")
+        os.chmod(path, 0o700)
+        for entry in path.iterdir():
+            shutil.rmtree(entry) if entry.is_dir() else entry.unlink()
+    return True
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+class IndexCache:
+    """
+    LRU cache of vector stores with a memory cap.
+
+    Entries over the cap are evicted oldest first; a cap of 0 keeps nothing in
+    memory. When a spill directory is configured, evicted indexes are saved to
+    disk and reloaded on the next hit instead of being embedded again. The
+    spill directory is pruned, least recently used first, to its own cap.
+    """
+
+    def __init__(self, max_mb: float = INDEX_CACHE_MAX_MB, spill_dir: Optional[str] = INDEX_SPILL_DIR,
+                 spill_max_mb: float = INDEX_SPILL_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir and not secure_spill_dir(self.spill_dir):
+            self.spill_dir = None
+        self.spill_max_bytes = int(spill_max_mb * 1024 * 1024)
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # Concurrent runs share the cache
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key_for(file_path: str, previous_hashes: Iterable[str] = ()) -> str:
+        """
+        Cache key from the document's content and the section hashes it was compared against
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        for section in sorted(previous_hashes):
+            digest.update(section.encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.spill_dir is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, key: str, embeddings):
+        """
+        Return a cached vector store, reloading it from the spill directory if needed
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            spill_path = self._spill_path(key)
+            if spill_path and spill_path.exists():
+                vectorstore = load_spilled_index(spill_path, embeddings)
+                # Mark as recently used so pruning removes older spills first
+                os.utime(spill_path)
+                self.put(key, vectorstore)
+                return vectorstore
+
+            return None
+
+    def put(self, key: str, vectorstore) -> None:
+        """
+        Add a vector store and evict older entries until the cache fits its cap
+        """
+        with self._lock:
+            self._entries[key] = vectorstore
+            self._entries.move_to_end(key)
+            self._sizes[key] = estimate_index_bytes(vectorstore)
+
+            while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+
+            # A single index larger than the cap is not kept in memory either
+            if self.size_bytes > self.max_bytes:
+                self._evict(key)
+
+    def spill_all(self) -> None:
+        """
+        Move every in-memory entry out of the process (to disk when a spill directory is set)
+        """
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def clear(self) -> None:
+        """
+        Drop all entries, including anything spilled to disk
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            if self.spill_dir and self.spill_dir.exists():
+                shutil.rmtree(self.spill_dir)
+
+    def _spill_path(self, key: str) -> Optional[Path]:
+        return self.spill_dir / key if self.spill_dir else None
+
+    def _evict(self, key: str) -> None:
+        vectorstore = self._entries.pop(key)
+        self._sizes.pop(key, None)
+        spill_path = self._spill_path(key)
+        if spill_path and not spill_path.exists():
+            vectorstore.save_local(str(spill_path))
+            self._prune_spill_dir()
+
+    def _prune_spill_dir(self) -> None:
+        """
+        Delete the least recently used spilled indexes until the directory fits its cap
+        """
+        spilled = sorted(
+            (path for path in self.spill_dir.iterdir() if path.is_dir()),
+            key=lambda path: path.stat().st_mtime,
+        )
+        total = sum(_dir_size(path) for path in spilled)
+        while spilled and total > self.spill_max_bytes:
+            oldest = spilled.pop(0)
+            total -= _dir_size(oldest)
+            shutil.rmtree(oldest)
+
+# Shared cache used by the document handler
+index_cache = IndexCache()
+
+def release_run_resources(result: Optional[Dict]) -> None:
+    """
+    Release the vector stores a finished run holds on to so they can be freed
+    before the next analysis starts
+    """
+    if result is not None:
+        result['document_analysis'] = None
+    if index_cache.spill_dir:
+        index_cache.spill_all()
+    gc.collect()
+
+def report_memory(label: str) -> None:
+    """
+    Print current process memory and index cache usage
+    """
+    rss = current_rss_mb()
+    rss_text = f"{rss:.1f} MB" if rss is not None else "unavailable"
+    cache_mb = index_cache.size_bytes / (1024 * 1024)
+    print(f"[memory] {label}: RSS {rss_text}, index cache {cache_mb:.1f} MB "
+          f"({len(index_cache)} indexes)")
+
+def track_memory(name: str, node: Callable) -> Callable:
+    """
+    Wrap a workflow node to report RSS and top tracemalloc allocations when
+    EARNINGS_MEMORY_REPORT=1. Returns the node unchanged otherwise.
+
+    RSS and tracemalloc cover the whole process, so per-node reports are only
+    made for single runs. Under the multi-run executor other jobs allocate at
+    the same time; the executor reports process-wide memory per job instead.
+    """
+    if not MEMORY_REPORT:
+        return node
+
+    @wraps(node)
+    def tracked(state):
+        if current_job.get() is not None:
+            return node(state)
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        rss_before = current_rss_mb()
+        before = tracemalloc.take_snapshot()
+
+        result = node(state)
+
+        after = tracemalloc.take_snapshot()
+        rss_after = current_rss_mb()
+        if rss_before is not None and rss_after is not None:
+            print(f"\n[memory] {name}: RSS {rss_before:.1f} -> {rss_after:.1f} MB "
+                  f"({rss_after - rss_before:+.1f} MB)")
+        else:
+            print(f"\n[memory] {name}: RSS unavailable")
+        for stat in after.compare_to(before, "lineno")[:MEMORY_REPORT_TOP]:
+            print(f"[memory]   {stat}")
+
+        return result
+
+    return tracked
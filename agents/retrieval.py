@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional, Tuple
+import os
+import numpy as np
+from langchain.schema import Document
+
+# Retrieval settings, overridable through the environment
+MIN_RELEVANCE_SCORE = float(os.getenv("EARNINGS_MIN_RELEVANCE_SCORE", "0.78"))
+RELATIVE_SCORE_MARGIN = float(os.getenv("EARNINGS_RELATIVE_SCORE_MARGIN", "0.08"))
+MAX_CHUNKS = int(os.getenv("EARNINGS_MAX_CHUNKS", "5"))
+FETCH_CHUNKS = int(os.getenv("EARNINGS_FETCH_CHUNKS", "12"))
+USE_MMR = os.getenv("EARNINGS_USE_MMR", "0") == "1"
+MMR_LAMBDA = float(os.getenv("EARNINGS_MMR_LAMBDA", "0.6"))
+
+NOT_FOUND = "Information not found."
+
+def _embed_query(vectorstore, query: str) -> np.ndarray:
+    """
+    Embed a query and scale it to unit length so it matches the
+    L2-normalized vectors stored in the index
+    """
+    vector = np.array(vectorstore.embedding_function.embed_query(query), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector
+
+def _cosine_from_distance(distance: float) -> float:
+    """
+    Convert a squared L2 distance between unit vectors into cosine similarity
+    """
+    return 1.0 - float(distance) / 2.0
+
+def retrieve_relevant_chunks(
+    vectorstore,
+    query: str,
+    min_score: float = MIN_RELEVANCE_SCORE,
+    max_k: int = MAX_CHUNKS,
+    fetch_k: int = FETCH_CHUNKS,
+    use_mmr: bool = USE_MMR,
+    lambda_mult: float = MMR_LAMBDA,
+    filter: Optional[Dict] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Score-aware retrieval:
+    1. Drops chunks below an absolute similarity threshold
+    2. Adapts k per query by keeping only chunks close to the best match
+    3. Optionally diversifies the result with maximal marginal relevance
+
+    Returns (document, cosine similarity) pairs, best first. An empty list
+    means nothing in the document is relevant to the query.
+    """
+    query_vector = _embed_query(vectorstore, query)
+
+    # FAISS applies metadata filters after the nearest-neighbour search, so
+    # search every chunk or matches outside the candidate window are lost
+    if filter is not None:
+        fetch_k = max(fetch_k, vectorstore.index.ntotal)
+
+    if use_mmr:
+        scored = vectorstore.max_marginal_relevance_search_with_score_by_vector(
+            query_vector, k=max_k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+        )
+    else:
+        scored = vectorstore.similarity_search_with_score_by_vector(
+            query_vector, k=fetch_k, filter=filter, fetch_k=fetch_k
+        )
+
+    scored = [(doc, _cosine_from_distance(distance)) for doc, distance in scored]
+    scored = [(doc, score) for doc, score in scored if score >= min_score]
+    if not scored:
+        return []
+
+    best_score = max(score for _, score in scored)
+    scored = [(doc, score) for doc, score in scored if score >= best_score - RELATIVE_SCORE_MARGIN]
+    scored.sort(key=lambda pair: pair[1], reverse=True)
+    return scored[:max_k]
+
+def retrieve_changed_chunks(vectorstore, queries: List[str], max_k: int = MAX_CHUNKS) -> List[str]:
+    """
+    Collect the chunks relevant to any of the queries that are new or changed
+    since the previous quarter's release, without duplicates
+    """
+    sections = []
+    for query in queries:
+        relevant_docs = retrieve_relevant_chunks(vectorstore, query, max_k=max_k, filter={"changed": True})
+        for doc, _ in relevant_docs:
+            if doc.page_content not in sections:
+                sections.append(doc.page_content)
+    return sections
@@ -1,11 +1,15 @@
 # document_handler.py
 from typing import TypedDict, Dict, Optional, List
 from pathlib import Path
+from datetime import datetime
 from langchain_openai import ChatOpenAI
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
+from langchain_core.messages import HumanMessage
+from .llm import invoke_llm
+from .history import save_analysis, release_changed
 
 # Import or define the state type
 class EarningsAnalysisState(TypedDict):
@@ -19,6 +23,8 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
     
 def summary_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
     """
@@ -63,7 +69,7 @@ def summary_agent(state: EarningsAnalysisState) -> EarningsAnalysisState:
         The company [raised/maintained/lowered] guidance: [specifics]. Net leverage [increased/decreased] to X.X times."
         """
         
-        final_comment = llm.invoke([HumanMessage(content=summary_prompt)])
+        final_comment = invoke_llm(llm, [HumanMessage(content=summary_prompt)])
         
         # Create more structured filepath
         base_path = Path("output")  # Base directory for all output
@@ -115,6 +121,14 @@ Industry Context:
         print("\nCredit comment generated successfully!")
         print(f"Saved to: {filename}")
         
+        # Keep structured results for next quarter's incremental analysis. An unchanged
+        # release only carried the previous results forward, so that record stays current.
+        if state.get('previous_analysis') and not release_changed(state):
+            print("Earnings release unchanged, previous structured results kept")
+        else:
+            history_file = save_analysis(state)
+            print(f"Structured results saved to: {history_file}")
+        
     except Exception as e:
         state['errors'].append(f"Summary error: {str(e)}")
         state['status'] = 'error'
@@ -11,6 +11,8 @@ from agents.financial_parser import financial_parser_agent
 from agents.credit_analyst import credit_analyst_agent
 from agents.industry_expert import industry_expert_agent
 from agents.summary import summary_agent
+from agents.history import load_previous_analysis
+from agents.memory import track_memory, release_run_resources, report_memory, MEMORY_REPORT
 
 # Define state
 class EarningsAnalysisState(TypedDict):
@@ -24,12 +26,20 @@ class EarningsAnalysisState(TypedDict):
     final_comment: Optional[str]
     status: str
     errors: List[str]
+    previous_analysis: Optional[Dict]
+    section_hashes: List[str]
 
 # Routing functions
 def route_after_financial(state: EarningsAnalysisState):
     """Determine routing after financial analysis"""
-    if state["status"] == "financial_analysis_complete":
-        return ["credit_analyst", "industry_expert"]
+    if state["status"] == "parallel_analysis_needed":
+        return "credit_analyst"
+    return "__end__"
+
+def route_after_credit(state: EarningsAnalysisState):
+    """Determine routing after credit analysis"""
+    if state["status"] != "error":
+        return "industry_expert"
     return "__end__"
 
 def should_summarize(state: EarningsAnalysisState):
@@ -38,35 +48,57 @@ def should_summarize(state: EarningsAnalysisState):
         return "summary"
     return "__end__"
 
-def create_workflow():
+def build_initial_state(ticker: str, industry: str, documents: Optional[Dict[str, str]] = None,
+                        previous_analysis: Optional[Dict] = None) -> EarningsAnalysisState:
+    """
+    Creates the starting state for one analysis run
+    """
+    return {
+        "ticker": ticker,
+        "industry": industry,
+        "documents": documents or {},
+        "document_analysis": None,
+        "financial_analysis": None,
+        "credit_analysis": None,
+        "industry_analysis": None,
+        "final_comment": None,
+        "status": "start",
+        "errors": [],
+        "previous_analysis": previous_analysis,
+        "section_hashes": []
+    }
+
+def create_workflow(show_graph: bool = True):
     """
     Creates and configures the workflow graph
     """
     # Create workflow
     builder = StateGraph(EarningsAnalysisState)
 
-    # Add nodes
-    builder.add_node("document_handler", document_handler_agent)
-    builder.add_node("financial_parser", financial_parser_agent)
-    builder.add_node("credit_analyst", credit_analyst_agent)
-    builder.add_node("industry_expert", industry_expert_agent)
-    builder.add_node("summary", summary_agent)
+    # Add nodes (wrapped for memory reporting when EARNINGS_MEMORY_REPORT=1)
+    builder.add_node("document_handler", track_memory("document_handler", document_handler_agent))
+    builder.add_node("financial_parser", track_memory("financial_parser", financial_parser_agent))
+    builder.add_node("credit_analyst", track_memory("credit_analyst", credit_analyst_agent))
+    builder.add_node("industry_expert", track_memory("industry_expert", industry_expert_agent))
+    builder.add_node("summary", track_memory("summary", summary_agent))
 
     # Add edges
     builder.add_edge("__start__", "document_handler")
     builder.add_edge("document_handler", "financial_parser")
 
-    # Add conditional edges
+    # Add conditional edges. Credit and industry analysis run in sequence:
+    # the industry expert builds on the credit analysis, and both agents
+    # return the full state, which parallel branches cannot merge.
     builder.add_conditional_edges(
         "financial_parser",
         route_after_financial,
-        ["credit_analyst", "industry_expert", "__end__"]
+        ["credit_analyst", "__end__"]
     )
 
     builder.add_conditional_edges(
         "credit_analyst",
-        should_summarize,
-        ["summary", "__end__"]
+        route_after_credit,
+        ["industry_expert", "__end__"]
     )
     builder.add_conditional_edges(
         "industry_expert",
@@ -80,7 +112,8 @@ def create_workflow():
     workflow = builder.compile()
 
     # Display the graph
-    display(Image(workflow.get_graph(xray=1).draw_mermaid_png()))
+    if show_graph:
+        display(Image(workflow.get_graph(xray=1).draw_mermaid_png()))
 
     return workflow
 
@@ -93,24 +126,24 @@ def run_analysis():
         ticker = input("Enter company ticker: ").strip().upper()
         industry = input("Enter company industry: ").strip()
         
+        # Offer incremental analysis when last quarter's results are available
+        previous_analysis = load_previous_analysis(ticker)
+        if previous_analysis:
+            incremental = input(
+                f"Found previous analysis for {ticker} from {previous_analysis['generated']}. "
+                "Run incremental analysis? (y/n): "
+            ).lower().strip()
+            if incremental != 'y':
+                previous_analysis = None
+        
         # Create workflow
         workflow = create_workflow()
         
         # Initialize state
-        initial_state = {
-            "ticker": ticker,
-            "industry": industry,
-            "documents": {},
-            "document_analysis": None,
-            "financial_analysis": None,
-            "credit_analysis": None,
-            "industry_analysis": None,
-            "final_comment": None,
-            "status": "start",
-            "errors": []
-        }
+        initial_state = build_initial_state(ticker, industry, previous_analysis=previous_analysis)
         
-        print(f"\nStarting analysis for {ticker} ({industry})...")
+        mode = "incremental" if previous_analysis else "full"
+        print(f"\nStarting {mode} analysis for {ticker} ({industry})...")
         result = workflow.invoke(initial_state)
         
         if result["status"] == "complete":
@@ -158,6 +191,12 @@ if __name__ == "__main__":
     while True:
         result = run_analysis()
         
+        # Free this run's indexes before the next analysis builds new ones
+        release_run_resources(result)
+        result = None
+        if MEMORY_REPORT:
+            report_memory("after run")
+        
         # Ask if user wants to analyze another company
         again = input("\nWould you like to analyze another company? (y/n): ").lower().strip()
         if again != 'y':
@@ -0,0 +1,217 @@
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import asyncio
+import contextvars
+import csv
+import functools
+import itertools
+import math
+import time
+
+from agents.llm import JobContext, LLMScheduler, current_job, set_llm_scheduler
+from agents.history import load_previous_analysis
+from agents.memory import release_run_resources, report_memory, MEMORY_REPORT
+from main import create_workflow, build_initial_state
+
+@dataclass
+class AnalysisJob:
+    """
+    One ticker to analyze. Lower priority values run first; the deadline is
+    counted in minutes from submission.
+    """
+    ticker: str
+    industry: str
+    earnings_path: str
+    priority: int = 10
+    deadline_minutes: Optional[float] = None
+    incremental: bool = True
+
+# Default caps. Priorities are enforced where LLM calls queue, so the job cap
+# must stay well above the LLM concurrency (see MultiRunExecutor).
+DEFAULT_MAX_CONCURRENT_JOBS = 32
+DEFAULT_LLM_CONCURRENCY = 8
+
+class MultiRunExecutor:
+    """
+    Runs many workflow invocations concurrently in one process:
+    1. Starts queued jobs in (priority, deadline) order
+    2. Shares a fixed LLM concurrency between running jobs
+    3. Lets LLM calls of urgent jobs overtake queued calls of less urgent ones
+
+    Each running job makes one LLM call at a time, so max_concurrent_jobs must
+    be well above llm_concurrency for calls to queue at the LLM scheduler, which
+    is where priorities take effect. With fewer jobs than LLM slots, an urgent
+    ticker waits for a whole low-priority run to finish before it starts.
+    """
+
+    def __init__(self, max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 llm_concurrency: int = DEFAULT_LLM_CONCURRENCY):
+        if max_concurrent_jobs < 2 * llm_concurrency:
+            print(f"Warning: {max_concurrent_jobs} concurrent jobs cannot keep {llm_concurrency} LLM slots "
+                  "busy; priorities will only apply when jobs start")
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.llm_scheduler = LLMScheduler(llm_concurrency)
+        # Own thread pool: the default one is capped at a few threads per CPU,
+        # which would limit concurrent jobs well below max_concurrent_jobs
+        self._threads = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="analysis")
+        self.workflow = create_workflow(show_graph=False)
+        self.results: List[Dict] = []
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+
+    async def start(self) -> None:
+        set_llm_scheduler(self.llm_scheduler)
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent_jobs)]
+
+    def submit(self, job: AnalysisJob) -> None:
+        """
+        Queue a job; it can be submitted while other jobs are already running
+        """
+        submitted = time.monotonic()
+        deadline = submitted + job.deadline_minutes * 60 if job.deadline_minutes is not None else math.inf
+        seq = next(self._seq)
+        context = JobContext(name=f"{job.ticker}#{seq}", priority=job.priority, deadline=deadline)
+        self._queue.put_nowait((job.priority, deadline, seq, submitted, job, context))
+        print(f"Queued {job.ticker} (priority {job.priority})")
+
+    async def join(self) -> List[Dict]:
+        """
+        Wait for every submitted job to finish and stop the workers
+        """
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._threads.shutdown(wait=False)
+        set_llm_scheduler(None)
+        return self.results
+
+    async def _worker(self) -> None:
+        while True:
+            _, deadline, _, submitted, job, context = await self._queue.get()
+            try:
+                self.results.append(await self._run_job(job, context, submitted, deadline))
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: AnalysisJob, context: JobContext, submitted: float, deadline: float) -> Dict:
+        """
+        Run one job end to end. Any failure, including loading history or
+        cleaning up, becomes an error summary so the worker keeps going.
+        """
+        started = time.monotonic()
+        result = None
+        try:
+            result = await self._invoke(job, context)
+            status, errors = result.get("status", "error"), list(result.get("errors", []))
+        except Exception as e:
+            status, errors = "error", [f"Job error: {str(e)}"]
+
+        finished = time.monotonic()
+
+        # Drop this run's indexes before the worker picks up the next job
+        try:
+            release_run_resources(result)
+        except Exception as e:
+            errors.append(f"Cleanup error: {str(e)}")
+
+        if MEMORY_REPORT:
+            report_memory(f"process-wide after {job.ticker}, including all running jobs")
+
+        return {
+            "ticker": job.ticker,
+            "priority": job.priority,
+            "status": status,
+            "errors": errors,
+            "final_comment": result.get("final_comment") if result else None,
+            "wait_seconds": started - submitted,
+            "run_seconds": finished - started,
+            "deadline_met": finished <= deadline,
+        }
+
+    async def _invoke(self, job: AnalysisJob, context: JobContext) -> Dict:
+        previous_analysis = load_previous_analysis(job.ticker) if job.incremental else None
+        state = build_initial_state(
+            job.ticker,
+            job.industry,
+            documents={"earnings_release": job.earnings_path},
+            previous_analysis=previous_analysis,
+        )
+        print(f"\nStarting analysis for {job.ticker} ({job.industry})...")
+
+        # Run in a copy of this context so LLM calls in the worker thread see this job
+        token = current_job.set(context)
+        try:
+            run = functools.partial(contextvars.copy_context().run, self.workflow.invoke, state)
+            return await asyncio.get_running_loop().run_in_executor(self._threads, run)
+        finally:
+            current_job.reset(token)
+
+async def run_jobs(jobs: List[AnalysisJob], max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                   llm_concurrency: int = DEFAULT_LLM_CONCURRENCY) -> List[Dict]:
+    """
+    Run a batch of jobs concurrently and return one summary per job in completion order
+    """
+    executor = MultiRunExecutor(max_concurrent_jobs, llm_concurrency)
+    await executor.start()
+    for job in jobs:
+        executor.submit(job)
+    return await executor.join()
+
+def load_jobs(csv_path: str, incremental: bool = True) -> List[AnalysisJob]:
+    """
+    Read jobs from a CSV with columns ticker, industry, path and optional
+    priority and deadline_minutes. Rows without an existing PDF are skipped
+    with a warning, since a batch run cannot prompt for the path.
+    """
+    jobs = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            ticker = (row.get("ticker") or "").strip().upper()
+            earnings_path = (row.get("path") or "").strip().strip('"')
+            if not earnings_path:
+                print(f"Warning: skipping {ticker or 'row'} (line {line}): no earnings release path")
+                continue
+            if not Path(earnings_path).is_file():
+                print(f"Warning: skipping {ticker or 'row'} (line {line}): file not found: {earnings_path}")
+                continue
+
+            deadline = (row.get("deadline_minutes") or "").strip()
+            jobs.append(
+                AnalysisJob(
+                    ticker=ticker,
+                    industry=row["industry"].strip(),
+                    earnings_path=earnings_path,
+                    priority=int((row.get("priority") or "").strip() or 10),
+                    deadline_minutes=float(deadline) if deadline else None,
+                    incremental=incremental,
+                )
+            )
+    return jobs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run earnings analyses for many tickers concurrently")
+    parser.add_argument("jobs", help="CSV file with ticker, industry, path, priority, deadline_minutes")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_CONCURRENT_JOBS,
+                        help="analyses running at the same time; keep well above --llm-concurrency")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="LLM calls in flight across all analyses")
+    parser.add_argument("--full", action="store_true", help="ignore previous results and run full analyses")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs, incremental=not args.full)
+    results = asyncio.run(run_jobs(jobs, args.max_jobs, args.llm_concurrency))
+
+    print("\nRun summary")
+    print("-" * 50)
+    for summary in results:
+        deadline = "met" if summary["deadline_met"] else "MISSED"
+        print(f"{summary['ticker']:<8} priority {summary['priority']:<3} {summary['status']:<10} "
+              f"waited {summary['wait_seconds']:.0f}s, ran {summary['run_seconds']:.0f}s, deadline {deadline}")
+        if summary["errors"]:
+            print(f"         errors: {summary['errors']}")